@@ -5,12 +5,20 @@ Provides API endpoints for resume screening, job management, and analytics.
 
 import os
 import sys
+import json
+import asyncio
 import logging
+import threading
+import uuid
+import zlib
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
 from typing import List, Optional
-from fastapi import FastAPI, HTTPException, UploadFile, File, Form
+from fastapi import FastAPI, HTTPException, UploadFile, File, Form, Response
+from fastapi.encoders import jsonable_encoder
 from fastapi.middleware.cors import CORSMiddleware
 from pydantic import BaseModel
-import joblib
 import pandas as pd
 import numpy as np
 
@@ -22,6 +30,11 @@ logger = logging.getLogger(__name__)
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
 sys.path.append(PROJECT_ROOT)
 
+from src.ml.dedup import SEED, SHINGLE_SIZE, compute_signature
+from src.ml.shards import MEMORY_BUDGET_MB, ShardManager
+from src.ml.train_model import get_model_path, preprocess_text, validate_tenant
+from src.utils.helpers import extract_text
+
 # Initialize FastAPI app
 app = FastAPI(
     title="Intelligent Resume Screening API",
@@ -38,8 +51,27 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
-# Global model variable
-model_data = None
+# Heavy endpoints run in worker processes, so they neither block the event loop
+# nor compete with it for the GIL. Workers run at a lower OS priority so that
+# cheap endpoints served by the event loop stay responsive under load.
+MAX_WORKERS = int(os.environ.get('API_MAX_WORKERS', 4))
+MAX_QUEUE_DEPTH = int(os.environ.get('API_MAX_QUEUE_DEPTH', 16))
+REQUEST_TIMEOUT = float(os.environ.get('API_REQUEST_TIMEOUT', 30))
+RETRY_AFTER = int(os.environ.get('API_RETRY_AFTER', 5))
+WORKER_NICE = int(os.environ.get('API_WORKER_NICE', 10))
+
+# Per-tenant models, loaded on first use and evicted under a memory budget.
+# Every tenant is served by the same worker, so each shard is loaded once and
+# splitting the budget evenly between the workers bounds the total.
+SHARD_MEMORY_MB = int(os.environ.get('API_SHARD_MEMORY_MB', MEMORY_BUDGET_MB))
+shards = ShardManager(memory_budget_bytes=SHARD_MEMORY_MB * 1024 * 1024)
+
+# Single-process pools keyed by worker index, started on first use and shut
+# down with the app, so the app can be restarted in-process
+executors = {}
+model_warmup = None
+heavy_in_flight = 0
+heavy_lock = threading.Lock()
 
 # Data models
 class JobCreate(BaseModel):
@@ -84,28 +116,189 @@ class AnalyticsData(BaseModel):
 
 
 def load_model():
-    """Load the trained model."""
-    global model_data
-    model_path = os.path.join(PROJECT_ROOT, 'src', 'models', 'resume_matcher.pkl')
+    """Start loading the default tenant's model in its worker."""
+    global model_warmup
+    model_warmup = None
+    if not os.path.exists(get_model_path()):
+        logger.warning(f"Model not found at {get_model_path()}")
+        return
     
-    if os.path.exists(model_path):
-        try:
-            model_data = joblib.load(model_path)
-            logger.info("Model loaded successfully")
-        except Exception as e:
-            logger.error(f"Error loading model: {e}")
-            model_data = None
-    else:
-        logger.warning(f"Model not found at {model_path}")
-        model_data = None
+    model_warmup = get_executor().submit(_warm_worker)
+    logger.info("Loading model in worker")
+
+
+def model_loaded():
+    """Whether the default tenant's worker has finished loading the model."""
+    future = model_warmup
+    if future is None or not future.done() or future.cancelled():
+        return False
+    return future.exception() is None and future.result()
+
+
+def _warm_worker():
+    try:
+        shard = shards.get(None)
+        if shard is not None:
+            get_payloads(shard)
+            return True
+    except Exception as e:
+        logger.error(f"Error loading model: {e}")
+    return False
+
+
+def _init_worker(memory_budget_bytes, niceness):
+    shards.memory_budget_bytes = memory_budget_bytes
+    if niceness and hasattr(os, 'nice'):
+        os.nice(niceness)
+
+
+def _call_worker(func, args):
+    # HTTP errors are returned rather than raised so they cross the process boundary intact
+    try:
+        return None, func(*args)
+    except HTTPException as e:
+        return (e.status_code, e.detail, e.headers), None
+
+
+def check_tenant(tenant=None):
+    """Validate a tenant name and check that the tenant has a trained model."""
+    try:
+        validate_tenant(tenant)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    
+    if tenant is not None and not os.path.exists(get_model_path(tenant)):
+        raise HTTPException(status_code=404, detail=f"Tenant not found: {tenant}")
+
+
+def get_shard(tenant=None):
+    """Get the index shard for a tenant."""
+    check_tenant(tenant)
+    
+    shard = shards.get(tenant)
+    if shard is None and tenant is not None:
+        raise HTTPException(status_code=404, detail=f"Tenant not found: {tenant}")
+    return shard
+
+
+def _release_slot():
+    global heavy_in_flight
+    with heavy_lock:
+        heavy_in_flight -= 1
+
+
+def get_executor(tenant=None):
+    """Get the worker serving a tenant, starting it if it is not running."""
+    return _get_pool(_worker_index(tenant))
+
+
+def _worker_index(tenant):
+    # A stable hash, so a tenant maps to the same worker across restarts
+    return zlib.crc32((tenant or '').encode('utf-8')) % MAX_WORKERS
+
+
+def _get_pool(index):
+    pool = executors.get(index)
+    if pool is None:
+        pool = executors[index] = ProcessPoolExecutor(
+            max_workers=1,
+            mp_context=multiprocessing.get_context('spawn'),
+            initializer=_init_worker,
+            initargs=(SHARD_MEMORY_MB * 1024 * 1024 // MAX_WORKERS, WORKER_NICE)
+        )
+    return pool
+
+
+def _discard_pool(pool):
+    """Drop a broken worker pool and return the error to send to the client."""
+    # A fresh pool is started for the next request unless another request
+    # already did, as shutting that one down would cancel its work
+    logger.error("Worker pool broke, restarting it")
+    reload_model = executors.get(_worker_index(None)) is pool
+    for index, current in list(executors.items()):
+        if current is pool:
+            del executors[index]
+    pool.shutdown(wait=False, cancel_futures=True)
+    
+    # The default model went down with its worker, so load it in the new one
+    if reload_model:
+        load_model()
+    return HTTPException(
+        status_code=503,
+        detail="Worker failed, please retry later",
+        headers={"Retry-After": str(RETRY_AFTER)}
+    )
+
+
+async def run_cpu_bound(func, *args, tenant=None):
+    """
+    Run a CPU-bound function in the worker serving the tenant.
+
+    Requests beyond the workers' capacity plus MAX_QUEUE_DEPTH are shed with
+    429, and requests not finished within REQUEST_TIMEOUT get 503. Functions
+    may return pre-encoded JSON as bytes, which is sent as is.
+    """
+    global heavy_in_flight
+    with heavy_lock:
+        if heavy_in_flight >= MAX_WORKERS + MAX_QUEUE_DEPTH:
+            logger.warning("Shedding request: executor queue is full")
+            raise HTTPException(
+                status_code=429,
+                detail="Server is busy, please retry later",
+                headers={"Retry-After": str(RETRY_AFTER)}
+            )
+        heavy_in_flight += 1
+    
+    # The slot is freed when the work actually finishes, even after a timeout
+    pool = get_executor(tenant)
+    try:
+        future = pool.submit(_call_worker, func, args)
+    except BrokenProcessPool:
+        _release_slot()
+        raise _discard_pool(pool)
+    except Exception:
+        _release_slot()
+        raise
+    future.add_done_callback(lambda _: _release_slot())
+    
+    try:
+        error, result = await asyncio.wait_for(asyncio.wrap_future(future), timeout=REQUEST_TIMEOUT)
+    except BrokenProcessPool:
+        raise _discard_pool(pool)
+    except asyncio.TimeoutError:
+        future.cancel()
+        logger.warning(f"Request timed out after {REQUEST_TIMEOUT}s: {func.__name__}")
+        raise HTTPException(
+            status_code=503,
+            detail="Request timed out, please retry later",
+            headers={"Retry-After": str(RETRY_AFTER)}
+        )
+    
+    if error is not None:
+        status_code, detail, headers = error
+        raise HTTPException(status_code=status_code, detail=detail, headers=headers)
+    if isinstance(result, bytes):
+        return Response(content=result, media_type='application/json')
+    return result
 
 
 @app.on_event("startup")
 async def startup_event():
-    """Load model on startup."""
+    """Start the workers and load the model on startup."""
+    # Processes are spawned on first submit, so give every worker a no-op
+    for index in range(MAX_WORKERS):
+        _get_pool(index).submit(os.getpid)
     load_model()
 
 
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Stop the workers."""
+    for pool in executors.values():
+        pool.shutdown(wait=False, cancel_futures=True)
+    executors.clear()
+
+
 @app.get("/")
 async def root():
     """Root endpoint."""
@@ -119,13 +312,105 @@ async def root():
 @app.get("/health")
 async def health_check():
     """Health check endpoint."""
-    return {"status": "healthy", "model_loaded": model_data is not None}
+    return {
+        "status": "healthy",
+        "model_loaded": model_loaded(),
+        "requests_in_flight": heavy_in_flight,
+        "max_in_flight": MAX_WORKERS + MAX_QUEUE_DEPTH
+    }
 
 
-@app.get("/analytics", response_model=AnalyticsData)
-async def get_analytics():
-    """Get analytics data for the dashboard."""
-    if model_data is None:
+def build_payloads(model_data):
+    """
+    Pre-encode the parts of the heavy responses that do not depend on the query.
+
+    Each candidate and ranking entry is stored as JSON text split around its
+    score, so a request only has to sort scores and join strings.
+    """
+    resumes = model_data.get('resumes', [])
+    jobs = model_data.get('jobs', [])
+    similarity_matrix = model_data.get('similarity_matrix', np.array([]))
+    
+    if len(similarity_matrix) > 0:
+        best_scores = similarity_matrix.max(axis=1)
+    else:
+        best_scores = np.zeros(len(resumes))
+    
+    candidate_prefixes = []
+    candidate_suffixes = []
+    ranking_prefixes = []
+    for i, resume in enumerate(resumes):
+        skills = resume.get('skills', '').split(', ') if resume.get('skills') else []
+        candidate = jsonable_encoder(Candidate(
+            id=i + 1,
+            name=resume.get('name', f'Candidate {i+1}'),
+            email=resume.get('email', f'candidate{i+1}@example.com'),
+            skills=skills,
+            match_score=0.0,
+            experience=resume.get('experience', ''),
+            education=resume.get('education', '')
+        ))
+        head = {key: candidate[key] for key in ('id', 'name', 'email', 'skills')}
+        tail = {key: candidate[key] for key in ('experience', 'education')}
+        candidate_prefixes.append(json.dumps(head)[:-1] + ', "match_score": ')
+        candidate_suffixes.append(', ' + json.dumps(tail)[1:])
+        ranking_prefixes.append(json.dumps({"name": candidate['name']})[:-1] + ', "score": ')
+    
+    # First job with each title, matching the lookup order of /ranking
+    job_index = {}
+    job_list = []
+    for i, job in enumerate(jobs):
+        job_index.setdefault(job.get('title', '').lower(), i)
+        job_list.append(Job(
+            id=i + 1,
+            title=job.get('title', f'Job {i+1}'),
+            company=job.get('company', 'Company'),
+            location=job.get('location', 'Unknown'),
+            job_description=job.get('job_description', ''),
+            required_skills=job.get('required_skills', '').split(', ') if job.get('required_skills') else [],
+            experience_level=job.get('experience_level', 'Mid Level'),
+            salary=job.get('salary', 0)
+        ))
+    
+    return {
+        'best_scores': best_scores,
+        'candidate_prefixes': candidate_prefixes,
+        'candidate_suffixes': candidate_suffixes,
+        'ranking_prefixes': ranking_prefixes,
+        'ranking_suffixes': ['}'] * len(ranking_prefixes),
+        'job_index': job_index,
+        'jobs_json': json.dumps(jsonable_encoder(job_list)).encode('utf-8')
+    }
+
+
+def get_payloads(shard):
+    """Get the shard's pre-encoded payloads, building them on first use."""
+    with shard.cache_lock:
+        payloads = shard.cache.get('payloads')
+        if payloads is None:
+            payloads = build_payloads(shard.model_data)
+            shard.cache['payloads'] = payloads
+            shard.size_bytes += payloads['best_scores'].nbytes + len(payloads['jobs_json']) + sum(
+                len(text) for key in ('candidate_prefixes', 'candidate_suffixes', 'ranking_prefixes', 'ranking_suffixes')
+                for text in payloads[key]
+            )
+    return payloads
+
+
+def encode_ranked(prefixes, suffixes, scores):
+    """Encode entries as JSON array bytes sorted by descending score."""
+    order = np.argsort(-scores, kind='stable')
+    entries = [
+        prefixes[i] + repr(score) + suffixes[i]
+        for i, score in zip(order.tolist(), scores[order].tolist())
+    ]
+    return ('[' + ', '.join(entries) + ']').encode('utf-8')
+
+
+def compute_analytics(tenant=None):
+    """Compute analytics data from the tenant's model."""
+    shard = get_shard(tenant)
+    if shard is None:
         # Return sample data if model not loaded
         return AnalyticsData(
             total_resumes=5,
@@ -137,12 +422,12 @@ async def get_analytics():
             }
         )
     
-    resumes = model_data.get('resumes', [])
-    similarity_matrix = model_data.get('similarity_matrix', np.array([]))
+    resumes = shard.model_data.get('resumes', [])
+    similarity_matrix = shard.model_data.get('similarity_matrix', np.array([]))
     
     if len(similarity_matrix) > 0:
         # Calculate average match score
-        max_scores = similarity_matrix.max(axis=1)
+        max_scores = get_payloads(shard)['best_scores']
         avg_score = float(np.mean(max_scores)) * 100
     else:
         avg_score = 0.0
@@ -158,10 +443,16 @@ async def get_analytics():
     )
 
 
-@app.get("/candidates", response_model=List[Candidate])
-async def get_candidates(job_id: Optional[int] = None):
-    """Get candidates list with match scores."""
-    if model_data is None:
+@app.get("/analytics", response_model=AnalyticsData)
+async def get_analytics(tenant: Optional[str] = None):
+    """Get analytics data for the dashboard."""
+    return await run_cpu_bound(compute_analytics, tenant, tenant=tenant)
+
+
+def list_candidates(job_id=None, tenant=None):
+    """Build the tenant's candidates list sorted by match score."""
+    shard = get_shard(tenant)
+    if shard is None:
         # Return sample candidates if model not loaded
         return [
             Candidate(
@@ -193,40 +484,29 @@ async def get_candidates(job_id: Optional[int] = None):
             )
         ]
     
-    resumes = model_data.get('resumes', [])
-    jobs = model_data.get('jobs', [])
-    similarity_matrix = model_data.get('similarity_matrix', np.array([]))
+    jobs = shard.model_data.get('jobs', [])
+    similarity_matrix = shard.model_data.get('similarity_matrix', np.array([]))
+    payloads = get_payloads(shard)
     
-    candidates = []
-    for i, resume in enumerate(resumes):
-        if job_id and job_id < len(jobs):
-            match_score = float(similarity_matrix[i][job_id])
-        elif len(similarity_matrix) > 0:
-            match_score = float(similarity_matrix[i].max())
-        else:
-            match_score = 0.0
-        
-        skills = resume.get('skills', '').split(', ') if resume.get('skills') else []
-        
-        candidates.append(Candidate(
-            id=i + 1,
-            name=resume.get('name', f'Candidate {i+1}'),
-            email=resume.get('email', f'candidate{i+1}@example.com'),
-            skills=skills,
-            match_score=match_score,
-            experience=resume.get('experience', ''),
-            education=resume.get('education', '')
-        ))
+    if job_id and job_id < len(jobs):
+        scores = similarity_matrix[:, job_id]
+    else:
+        scores = payloads['best_scores']
     
     # Sort by match score
-    candidates.sort(key=lambda x: x.match_score, reverse=True)
-    return candidates
+    return encode_ranked(payloads['candidate_prefixes'], payloads['candidate_suffixes'], scores)
 
 
-@app.get("/jobs", response_model=List[Job])
-async def get_jobs():
-    """Get all jobs."""
-    if model_data is None:
+@app.get("/candidates", response_model=List[Candidate])
+async def get_candidates(job_id: Optional[int] = None, tenant: Optional[str] = None):
+    """Get candidates list with match scores."""
+    return await run_cpu_bound(list_candidates, job_id, tenant, tenant=tenant)
+
+
+def list_jobs(tenant=None):
+    """Build the list of all the tenant's jobs."""
+    shard = get_shard(tenant)
+    if shard is None:
         # Return sample jobs if model not loaded
         return [
             Job(
@@ -261,28 +541,23 @@ async def get_jobs():
             )
         ]
     
-    jobs = model_data.get('jobs', [])
-    result = []
-    for i, job in enumerate(jobs):
-        result.append(Job(
-            id=i + 1,
-            title=job.get('title', f'Job {i+1}'),
-            company=job.get('company', 'Company'),
-            location=job.get('location', 'Unknown'),
-            job_description=job.get('job_description', ''),
-            required_skills=job.get('required_skills', '').split(', ') if job.get('required_skills') else [],
-            experience_level=job.get('experience_level', 'Mid Level'),
-            salary=job.get('salary', 0)
-        ))
-    
-    return result
+    return get_payloads(shard)['jobs_json']
+
+
+@app.get("/jobs", response_model=List[Job])
+async def get_jobs(tenant: Optional[str] = None):
+    """Get all jobs."""
+    return await run_cpu_bound(list_jobs, tenant, tenant=tenant)
 
 
 @app.post("/jobs", response_model=Job)
-async def create_job(job: JobCreate):
+async def create_job(job: JobCreate, tenant: Optional[str] = None):
     """Create a new job posting."""
+    # Cheap enough to validate on the event loop without loading the shard
+    check_tenant(tenant)
+    
     # In a real app, this would save to a database
-    logger.info(f"Creating job: {job.title}")
+    logger.info(f"Creating job for tenant {tenant or 'default'}: {job.title}")
     
     # Return the created job with an ID
     return Job(
@@ -297,10 +572,10 @@ async def create_job(job: JobCreate):
     )
 
 
-@app.get("/ranking")
-async def get_ranking(job: Optional[str] = None):
-    """Get candidate rankings for a specific job."""
-    if model_data is None:
+def rank_candidates(job=None, tenant=None):
+    """Rank the tenant's candidates against the job with the given title."""
+    shard = get_shard(tenant)
+    if shard is None:
         # Return sample rankings if model not loaded
         return [
             {"name": "John Doe", "score": 0.85},
@@ -308,33 +583,26 @@ async def get_ranking(job: Optional[str] = None):
             {"name": "Mike Johnson", "score": 0.72}
         ]
     
-    resumes = model_data.get('resumes', [])
-    jobs = model_data.get('jobs', [])
-    similarity_matrix = model_data.get('similarity_matrix', np.array([]))
+    resumes = shard.model_data.get('resumes', [])
+    similarity_matrix = shard.model_data.get('similarity_matrix', np.array([]))
+    payloads = get_payloads(shard)
     
     # Find job index
-    job_idx = 0
-    if job:
-        for i, j in enumerate(jobs):
-            if j.get('title', '').lower() == job.lower():
-                job_idx = i
-                break
+    job_idx = payloads['job_index'].get(job.lower(), 0) if job else 0
     
-    rankings = []
-    for i, resume in enumerate(resumes):
-        if len(similarity_matrix) > job_idx:
-            score = float(similarity_matrix[i][job_idx])
-        else:
-            score = 0.0
-        
-        rankings.append({
-            "name": resume.get('name', f'Candidate {i+1}'),
-            "score": score
-        })
+    if len(similarity_matrix) > job_idx:
+        scores = similarity_matrix[:, job_idx]
+    else:
+        scores = np.zeros(len(resumes))
     
     # Sort by score
-    rankings.sort(key=lambda x: x['score'], reverse=True)
-    return rankings
+    return encode_ranked(payloads['ranking_prefixes'], payloads['ranking_suffixes'], scores)
+
+
+@app.get("/ranking")
+async def get_ranking(job: Optional[str] = None, tenant: Optional[str] = None):
+    """Get candidate rankings for a specific job."""
+    return await run_cpu_bound(rank_candidates, job, tenant, tenant=tenant)
 
 
 @app.post("/emails")
@@ -350,24 +618,73 @@ async def send_emails_alt(email_request: EmailRequest):
     return await send_emails(email_request)
 
 
+def screen_resume(filename, contents, tenant=None):
+    """
+    Screen an uploaded resume and check it for near-duplicates within the tenant.
+    
+    Only earlier uploads are compared: the trained corpus is fingerprinted from
+    its structured fields, which cannot be recovered from an uploaded file.
+    """
+    shard = get_shard(tenant)
+    upload_id = uuid.uuid4().hex
+    text = extract_text(filename, contents)
+    
+    result = {
+        "status": "success",
+        "upload_id": upload_id,
+        "filename": filename,
+        "match_score": 0.75,
+        "matched_skills": ["Python", "SQL", "Machine Learning"],
+        "missing_skills": ["TensorFlow"],
+        "duplicate_scope": "uploads",
+        "duplicate_of": []
+    }
+    
+    # Without extracted text or a trained model there is nothing to compare against
+    if text is None or shard is None:
+        result["status"] = "unchecked"
+        result["duplicate_of"] = None
+        return result
+    
+    # Check for near-duplicates of resumes uploaded earlier
+    dedup_config = shard.model_data.get('dedup', {})
+    signature = compute_signature(
+        preprocess_text(text),
+        num_perm=shard.dedup_index.num_perm,
+        seed=dedup_config.get('seed', SEED),
+        shingle_size=dedup_config.get('shingle_size', SHINGLE_SIZE)
+    )
+    # Only new resumes are indexed, so repeated uploads collapse onto the original
+    matches = shard.register_upload(upload_id, filename, signature)
+    duplicates = [
+        {
+            "upload_id": key,
+            "filename": shard.uploads.get(key),
+            "similarity": similarity
+        }
+        for key, similarity in matches
+    ]
+    
+    if duplicates:
+        logger.info(f"Resume {filename} is a near-duplicate of {len(duplicates)} earlier uploads")
+        result["status"] = "duplicate"
+        result["duplicate_of"] = duplicates
+    
+    return result
+
+
 @app.post("/upload-resume")
 async def upload_resume(
     file: UploadFile = File(...),
-    job_id: Optional[int] = Form(None)
+    job_id: Optional[int] = Form(None),
+    tenant: Optional[str] = Form(None)
 ):
     """Upload and screen a resume."""
     logger.info(f"Uploading resume: {file.filename}")
     
-    # In a real app, this would process the PDF/DOCX file
-    # and compare against job requirements
-    
-    return {
-        "status": "success",
-        "filename": file.filename,
-        "match_score": 0.75,
-        "matched_skills": ["Python", "SQL", "Machine Learning"],
-        "missing_skills": ["TensorFlow"]
-    }
+    # In a real app, this would also compare against job requirements
+    contents = await file.read()
+    return await run_cpu_bound(screen_resume, file.filename, contents, tenant, tenant=tenant)
 
 
 if __name__ == "__main__":
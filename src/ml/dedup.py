@@ -0,0 +1,189 @@
+"""
+Near-duplicate resume detection for the Intelligent Resume Screening System.
+Uses MinHash signatures of the preprocessed resume text and banded LSH buckets
+so that re-uploaded or lightly edited resumes can be found in near-linear time.
+"""
+
+import re
+import zlib
+import logging
+from collections import defaultdict
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Default detector settings
+DEDUP_THRESHOLD = 0.9
+NUM_PERM = 128
+SHINGLE_SIZE = 3
+SEED = 42
+
+# Universal hashing h(x) = (a * x + b) mod p with a, b, x < 2^32 never overflows uint64
+_PRIME = np.uint64(4294967311)
+_MAX_HASH = np.uint32(0xFFFFFFFF)
+
+# Bound on the (num_perm x shingles) work matrix used by bulk hashing
+_CHUNK_SHINGLES = 65536
+
+
+def _permutations(num_perm, seed):
+    """Generate the hash permutation coefficients shared by all signatures."""
+    rng = np.random.RandomState(seed)
+    a = rng.randint(1, 2 ** 32, size=num_perm, dtype=np.uint64)
+    b = rng.randint(0, 2 ** 32, size=num_perm, dtype=np.uint64)
+    return a, b
+
+
+def shingle_hashes(text, shingle_size=SHINGLE_SIZE):
+    """Hash the word shingles of a preprocessed text to 32-bit integers."""
+    tokens = re.findall(r'\w+', str(text))
+    if not tokens:
+        return np.empty(0, dtype=np.uint64)
+    if len(tokens) < shingle_size:
+        shingles = {' '.join(tokens)}
+    else:
+        shingles = {
+            ' '.join(tokens[i:i + shingle_size])
+            for i in range(len(tokens) - shingle_size + 1)
+        }
+    return np.fromiter(
+        (zlib.crc32(s.encode('utf-8')) for s in shingles),
+        dtype=np.uint64,
+        count=len(shingles)
+    )
+
+
+def compute_signature(text, num_perm=NUM_PERM, seed=SEED, shingle_size=SHINGLE_SIZE):
+    """Compute the MinHash signature of a single document."""
+    hashes = shingle_hashes(text, shingle_size)
+    if len(hashes) == 0:
+        return np.full(num_perm, _MAX_HASH, dtype=np.uint32)
+    a, b = _permutations(num_perm, seed)
+    values = (a[:, None] * hashes[None, :] + b[:, None]) % _PRIME
+    return values.min(axis=1).astype(np.uint32)
+
+
+def compute_signatures(texts, num_perm=NUM_PERM, seed=SEED, shingle_size=SHINGLE_SIZE):
+    """Compute MinHash signatures for a corpus as an (N, num_perm) uint32 array."""
+    texts = list(texts)
+    signatures = np.full((len(texts), num_perm), _MAX_HASH, dtype=np.uint32)
+    a, b = _permutations(num_perm, seed)
+
+    doc_hashes = [shingle_hashes(text, shingle_size) for text in texts]
+    non_empty = [i for i, h in enumerate(doc_hashes) if len(h) > 0]
+
+    # Hash documents in chunks so the work matrix stays bounded
+    start = 0
+    while start < len(non_empty):
+        end = start
+        total = 0
+        while end < len(non_empty) and (end == start or total + len(doc_hashes[non_empty[end]]) <= _CHUNK_SHINGLES):
+            total += len(doc_hashes[non_empty[end]])
+            end += 1
+
+        chunk = non_empty[start:end]
+        lengths = np.array([len(doc_hashes[i]) for i in chunk])
+        offsets = np.concatenate(([0], np.cumsum(lengths)[:-1]))
+        hashes = np.concatenate([doc_hashes[i] for i in chunk])
+
+        values = (a[:, None] * hashes[None, :] + b[:, None]) % _PRIME
+        signatures[chunk] = np.minimum.reduceat(values, offsets, axis=1).T.astype(np.uint32)
+        start = end
+
+    return signatures
+
+
+def optimal_bands(threshold, num_perm=NUM_PERM):
+    """Pick the (bands, rows) split whose LSH S-curve threshold is closest to the target."""
+    best = None
+    for rows in range(1, num_perm + 1):
+        if num_perm % rows:
+            continue
+        bands = num_perm // rows
+        error = abs((1.0 / bands) ** (1.0 / rows) - threshold)
+        if best is None or error < best[0]:
+            best = (error, bands, rows)
+    return best[1], best[2]
+
+
+def is_empty_signature(signature):
+    """Check whether a signature belongs to a document without any shingles."""
+    return bool(np.all(signature == _MAX_HASH))
+
+
+class MinHashLSH:
+    """Banded LSH index over MinHash signatures."""
+
+    def __init__(self, threshold=DEDUP_THRESHOLD, num_perm=NUM_PERM):
+        self.threshold = threshold
+        self.num_perm = num_perm
+        self.bands, self.rows = optimal_bands(threshold, num_perm)
+        self.buckets = [defaultdict(list) for _ in range(self.bands)]
+        self.signatures = {}
+
+    def __len__(self):
+        return len(self.signatures)
+
+    def __contains__(self, key):
+        return key in self.signatures
+
+    def _band_keys(self, signature):
+        for band in range(self.bands):
+            yield band, signature[band * self.rows:(band + 1) * self.rows].tobytes()
+
+    def insert(self, key, signature):
+        """Add a signature to the index under the given key."""
+        if key in self.signatures:
+            raise ValueError(f"Key already in index: {key}")
+        signature = np.asarray(signature, dtype=np.uint32)
+        self.signatures[key] = signature
+        for band, band_key in self._band_keys(signature):
+            self.buckets[band][band_key].append(key)
+
+    def query(self, signature):
+        """Return (key, similarity) pairs at or above the threshold, most similar first."""
+        signature = np.asarray(signature, dtype=np.uint32)
+        if is_empty_signature(signature):
+            return []
+
+        candidates = set()
+        for band, band_key in self._band_keys(signature):
+            candidates.update(self.buckets[band].get(band_key, ()))
+        if not candidates:
+            return []
+
+        keys = list(candidates)
+        stacked = np.stack([self.signatures[k] for k in keys])
+        similarities = (stacked == signature).mean(axis=1)
+
+        matches = [
+            (key, float(sim)) for key, sim in zip(keys, similarities)
+            if sim >= self.threshold
+        ]
+        matches.sort(key=lambda x: x[1], reverse=True)
+        return matches
+
+
+def find_duplicates(signatures, threshold=DEDUP_THRESHOLD):
+    """
+    Find near-duplicates in a corpus of signatures.
+
+    Returns an array mapping each row to the index of the earlier row it
+    duplicates, or -1 if the row is the first of its group.
+    """
+    signatures = np.asarray(signatures, dtype=np.uint32)
+    lsh = MinHashLSH(threshold=threshold, num_perm=signatures.shape[1])
+    duplicate_of = np.full(len(signatures), -1, dtype=np.int64)
+
+    # Only canonical rows are indexed, so every match is already a group head
+    for i, signature in enumerate(signatures):
+        if is_empty_signature(signature):
+            continue
+        matches = lsh.query(signature)
+        if matches:
+            duplicate_of[i] = matches[0][0]
+        else:
+            lsh.insert(i, signature)
+
+    logger.info(f"Found {int((duplicate_of >= 0).sum())} near-duplicates among {len(signatures)} documents")
+    return duplicate_of
@@ -0,0 +1,194 @@
+"""
+Offline evaluation script for the Intelligent Resume Screening System.
+Measures ranking quality and cost of different matching configurations so
+speed/quality tradeoffs can be chosen on data.
+"""
+
+import os
+import sys
+import time
+import logging
+import pandas as pd
+import numpy as np
+from sklearn.metrics.pairwise import cosine_similarity
+from joblib import Parallel, delayed
+
+# Set up logging
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
+logger = logging.getLogger(__name__)
+
+# Add project root to path
+PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
+
+from src.ml.dedup import DEDUP_THRESHOLD
+from src.ml.train_model import VECTORIZER_PARAMS, build_vectorizer, prepare_corpus
+
+# Cutoffs reported for every metric
+K_VALUES = (10, 50, 100)
+
+# Vectorizer settings compared by default
+DEFAULT_GRID = [
+    VECTORIZER_PARAMS,
+    {'max_features': 100, 'stop_words': 'english'},
+    {'max_features': 250, 'stop_words': 'english'},
+    {'max_features': 1000, 'stop_words': 'english'},
+    {'max_features': None, 'stop_words': 'english'},
+    {'max_features': 500, 'stop_words': None},
+    {'max_features': 500, 'stop_words': 'english', 'ngram_range': (1, 2)},
+]
+
+# Number of jobs scored per block when computing metrics
+JOB_CHUNK_SIZE = 512
+
+# Number of single-job queries timed per configuration
+LATENCY_QUERIES = 200
+
+
+def ranking_metrics(scores, relevant, k_values=K_VALUES):
+    """
+    Compute precision@K, recall@K and NDCG@K for a block of queries.
+
+    scores and relevant are (n_queries, n_items) arrays; returns a dict of
+    per-query metric arrays keyed like 'precision@10'.
+    """
+    n_items = scores.shape[1]
+    max_k = min(max(k_values), n_items)
+
+    # Top max_k items per query, sorted by descending score
+    top = np.argpartition(-scores, max_k - 1, axis=1)[:, :max_k]
+    top_scores = np.take_along_axis(scores, top, axis=1)
+    order = np.argsort(-top_scores, axis=1, kind='stable')
+    top = np.take_along_axis(top, order, axis=1)
+    hits = np.take_along_axis(relevant, top, axis=1)
+
+    n_relevant = relevant.sum(axis=1)
+    discounts = 1.0 / np.log2(np.arange(2, max_k + 2))
+    ideal_dcg = np.concatenate(([0.0], np.cumsum(discounts)))
+
+    metrics = {}
+    for k in k_values:
+        k_eff = min(k, max_k)
+        n_hits = hits[:, :k_eff].sum(axis=1)
+        dcg = (hits[:, :k_eff] * discounts[:k_eff]).sum(axis=1)
+        idcg = ideal_dcg[np.minimum(n_relevant, k_eff)]
+
+        metrics[f'precision@{k}'] = n_hits / k
+        metrics[f'recall@{k}'] = np.divide(n_hits, n_relevant, out=np.zeros(len(n_hits)), where=n_relevant > 0)
+        metrics[f'ndcg@{k}'] = np.divide(dcg, idcg, out=np.zeros(len(dcg)), where=idcg > 0)
+
+    return metrics
+
+
+def evaluate_quality(params, resume_texts, job_texts, resume_labels, job_labels, k_values=K_VALUES):
+    """Train one vectorizer configuration and measure its ranking quality."""
+    vectorizer = build_vectorizer(**params)
+    vectorizer.fit(pd.concat([resume_texts, job_texts]))
+    resume_vectors = vectorizer.transform(resume_texts)
+    job_vectors = vectorizer.transform(job_texts)
+
+    # Rank all resumes for every job, a block of jobs at a time
+    per_job = {}
+    for start_idx in range(0, len(job_texts), JOB_CHUNK_SIZE):
+        end_idx = start_idx + JOB_CHUNK_SIZE
+        scores = cosine_similarity(job_vectors[start_idx:end_idx], resume_vectors)
+        relevant = job_labels[start_idx:end_idx, None] == resume_labels[None, :]
+        relevant &= resume_labels[None, :] >= 0
+        for name, values in ranking_metrics(scores, relevant, k_values).items():
+            per_job.setdefault(name, []).append(values)
+
+    # Jobs without a role or any matching resume carry no signal
+    has_relevant = (job_labels >= 0) & np.isin(job_labels, resume_labels[resume_labels >= 0])
+
+    result = {}
+    for name, blocks in per_job.items():
+        values = np.concatenate(blocks)[has_relevant]
+        result[name] = float(values.mean()) if len(values) else 0.0
+    return result
+
+
+def measure_cost(params, resume_texts, job_texts, k_values=K_VALUES, latency_queries=LATENCY_QUERIES):
+    """Measure train time, index size and query latency of one vectorizer configuration."""
+    vectorizer = build_vectorizer(**params)
+
+    # Train time covers fitting and building the resume index
+    start = time.perf_counter()
+    vectorizer.fit(pd.concat([resume_texts, job_texts]))
+    resume_vectors = vectorizer.transform(resume_texts)
+    train_time = time.perf_counter() - start
+
+    index_bytes = resume_vectors.data.nbytes + resume_vectors.indices.nbytes + resume_vectors.indptr.nbytes
+
+    # Time single-job queries the way the API serves them
+    max_k = min(max(k_values), resume_vectors.shape[0])
+    latencies = []
+    for text in job_texts.iloc[:latency_queries]:
+        start = time.perf_counter()
+        scores = cosine_similarity(vectorizer.transform([text]), resume_vectors)[0]
+        np.argpartition(-scores, max_k - 1)[:max_k]
+        latencies.append(time.perf_counter() - start)
+    latencies = np.array(latencies) * 1000
+
+    return {
+        'train_time_s': train_time,
+        'vocabulary_size': len(vectorizer.vocabulary_),
+        'index_mb': index_bytes / (1024 * 1024),
+        'latency_mean_ms': float(latencies.mean()) if len(latencies) else 0.0,
+        'latency_p95_ms': float(np.percentile(latencies, 95)) if len(latencies) else 0.0,
+    }
+
+
+def evaluate(grid=None, k_values=K_VALUES, n_jobs=-1, output_path=None, tenant=None,
+             dedup_threshold=DEDUP_THRESHOLD, collapse_duplicates=True):
+    """
+    Evaluate every configuration in the grid on a tenant's data and return the results table.
+
+    The corpus is prepared exactly as train_model() prepares it, including the
+    near-duplicate handling. Resumes whose target_role equals a job's job_role
+    are treated as relevant. Quality is computed for all configurations in
+    parallel; train time and latency are then measured one configuration at a
+    time so the timings are not skewed by other work.
+    """
+    logger.info("Starting evaluation...")
+    grid = grid or DEFAULT_GRID
+
+    resumes_df, jobs_df, _ = prepare_corpus(tenant, dedup_threshold, collapse_duplicates)
+    resume_texts = resumes_df['combined_features']
+    job_texts = jobs_df['combined_features']
+
+    # Encode roles with a shared vocabulary so labels compare as integers;
+    # missing or blank roles become -1 and never count as a match
+    resume_roles = resumes_df['target_role'].astype('string').str.strip().str.lower().replace('', np.nan)
+    job_roles = jobs_df['job_role'].astype('string').str.strip().str.lower().replace('', np.nan)
+    codes, _ = pd.factorize(pd.concat([resume_roles, job_roles], ignore_index=True))
+    resume_labels = codes[:len(resume_roles)]
+    job_labels = codes[len(resume_roles):]
+
+    logger.info(f"Evaluating {len(grid)} configurations on {len(resumes_df)} resumes and {len(jobs_df)} jobs")
+    quality = Parallel(n_jobs=n_jobs)(
+        delayed(evaluate_quality)(params, resume_texts, job_texts, resume_labels, job_labels, k_values)
+        for params in grid
+    )
+
+    logger.info("Measuring train time and query latency...")
+    results = []
+    for params, metrics in zip(grid, quality):
+        result = {'config': str(params)}
+        result.update(measure_cost(params, resume_texts, job_texts, k_values))
+        result.update(metrics)
+        results.append(result)
+    results_df = pd.DataFrame(results)
+
+    # Save results
+    if output_path is None:
+        output_path = os.path.join(PROJECT_ROOT, 'data', 'processed', 'evaluation_results.csv')
+    os.makedirs(os.path.dirname(output_path), exist_ok=True)
+    results_df.to_csv(output_path, index=False)
+    logger.info(f"Evaluation results saved to {output_path}")
+
+    return results_df
+
+
+if __name__ == "__main__":
+    results = evaluate()
+    print(results.to_string(index=False))
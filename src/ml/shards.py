@@ -0,0 +1,207 @@
+"""
+Per-tenant index shards for the Intelligent Resume Screening System.
+Each tenant's trained model is loaded on first use and kept in memory under a
+global budget, evicting the least recently used shards when it is exceeded.
+Resumes accepted through the API are logged per tenant so that near-duplicate
+checks survive eviction, retraining and restarts.
+"""
+
+import os
+import json
+import base64
+import logging
+import threading
+from collections import OrderedDict, defaultdict
+import numpy as np
+import joblib
+
+try:
+    import fcntl
+except ImportError:  # pragma: no cover - not available on Windows
+    fcntl = None
+
+from src.ml.dedup import DEDUP_THRESHOLD, NUM_PERM, MinHashLSH
+from src.ml.train_model import get_model_path, get_uploads_path
+
+logger = logging.getLogger(__name__)
+
+# Default memory budget for all loaded shards
+MEMORY_BUDGET_MB = 2048
+
+# Estimated index overhead of one accepted upload on top of its signature
+UPLOAD_OVERHEAD_BYTES = 1024
+
+
+class Shard:
+    """A tenant's loaded model together with its near-duplicate index."""
+
+    def __init__(self, tenant, model_data, mtime, size_bytes):
+        self.tenant = tenant
+        self.model_data = model_data
+        self.mtime = mtime
+        self.size_bytes = size_bytes
+        self.dedup_lock = threading.Lock()
+
+        # Filenames of accepted uploads, keyed by upload id
+        self.uploads = {}
+        self.uploads_path = get_uploads_path(tenant)
+        self._uploads_offset = 0
+
+        # Derived data the API caches for the shard's lifetime
+        self.cache = {}
+        self.cache_lock = threading.Lock()
+
+        # Uploads are raw resume text while the corpus signatures are built from
+        # its structured fields, so uploads are only compared with each other
+        dedup_config = model_data.get('dedup', {})
+        self.dedup_index = MinHashLSH(
+            threshold=dedup_config.get('threshold', DEDUP_THRESHOLD),
+            num_perm=dedup_config.get('num_perm', NUM_PERM)
+        )
+
+    @classmethod
+    def load(cls, tenant, model_path):
+        """Load a shard from its model file and replay its accepted uploads."""
+        stat = os.stat(model_path)
+        # Arrays are memory-mapped, so loading is fast and pages are read on use.
+        # Models are replaced atomically, so a mapped file never changes under us.
+        model_data = joblib.load(model_path, mmap_mode='r')
+        # The pickle size is used as an estimate of the shard's memory footprint
+        shard = cls(tenant, model_data, stat.st_mtime, stat.st_size)
+        with shard.dedup_lock:
+            shard._sync_uploads()
+        return shard
+
+    def _sync_uploads(self):
+        # Index uploads logged since the last sync, possibly by another shard or process
+        try:
+            with open(self.uploads_path, 'rb') as f:
+                f.seek(self._uploads_offset)
+                data = f.read()
+        except FileNotFoundError:
+            return
+
+        # A line without its newline is still being written
+        end = data.rfind(b'\n') + 1
+        for line in data[:end].splitlines():
+            if not line.strip():
+                continue
+            try:
+                record = json.loads(line)
+                signature = np.frombuffer(base64.b64decode(record['signature']), dtype=np.uint32)
+            except (ValueError, KeyError) as e:
+                logger.warning(f"Skipping corrupt upload record in {self.uploads_path}: {e}")
+                continue
+            self._index_upload(record['upload_id'], record['filename'], signature)
+        self._uploads_offset += end
+
+    def _index_upload(self, upload_id, filename, signature):
+        if upload_id in self.dedup_index:
+            return
+        self.dedup_index.insert(upload_id, signature)
+        self.uploads[upload_id] = filename
+        self.size_bytes += signature.nbytes + UPLOAD_OVERHEAD_BYTES
+
+    def register_upload(self, upload_id, filename, signature):
+        """
+        Check an uploaded resume against the tenant's earlier uploads.
+
+        Returns the (key, similarity) matches. A resume without matches is
+        logged and indexed, so later copies are reported as duplicates of it.
+        """
+        signature = np.asarray(signature, dtype=np.uint32)
+        os.makedirs(os.path.dirname(self.uploads_path), exist_ok=True)
+
+        with self.dedup_lock, open(self.uploads_path, 'ab') as log:
+            # The file lock makes check-then-append atomic across processes
+            if fcntl is not None:
+                fcntl.flock(log, fcntl.LOCK_EX)
+            try:
+                self._sync_uploads()
+                matches = self.dedup_index.query(signature)
+                if not matches:
+                    record = {
+                        'upload_id': upload_id,
+                        'filename': filename,
+                        'signature': base64.b64encode(signature.tobytes()).decode('ascii')
+                    }
+                    log.write(json.dumps(record).encode('utf-8') + b'\n')
+                    log.flush()
+                    self._index_upload(upload_id, filename, signature)
+                    self._uploads_offset = log.tell()
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(log, fcntl.LOCK_UN)
+        return matches
+
+
+class ShardManager:
+    """Lazily loads tenant shards and evicts them in LRU order under a memory budget."""
+
+    def __init__(self, memory_budget_bytes=MEMORY_BUDGET_MB * 1024 * 1024):
+        self.memory_budget_bytes = memory_budget_bytes
+        self._shards = OrderedDict()
+        self._lock = threading.Lock()
+        self._load_locks = defaultdict(threading.Lock)
+
+    def _cached(self, tenant, mtime):
+        shard = self._shards.get(tenant)
+        if shard is not None and shard.mtime == mtime:
+            self._shards.move_to_end(tenant)
+            return shard
+        return None
+
+    def get(self, tenant=None):
+        """
+        Get the shard for a tenant, loading it if needed.
+
+        Returns None if the tenant has no trained model. A shard whose model
+        file changed since it was loaded is reloaded, so retraining one tenant
+        takes effect without touching any other.
+        """
+        model_path = get_model_path(tenant)
+        try:
+            mtime = os.path.getmtime(model_path)
+        except OSError:
+            self.evict(tenant)
+            return None
+
+        with self._lock:
+            shard = self._cached(tenant, mtime)
+            if shard is not None:
+                # Shards grow as uploads are indexed, so recheck the budget
+                self._evict_over_budget()
+                return shard
+            load_lock = self._load_locks[tenant]
+
+        # Loading holds only this tenant's lock so other tenants are still served
+        with load_lock:
+            with self._lock:
+                shard = self._cached(tenant, mtime)
+                if shard is not None:
+                    return shard
+
+            logger.info(f"Loading shard for tenant: {tenant or 'default'}")
+            shard = Shard.load(tenant, model_path)
+
+            with self._lock:
+                self._shards[tenant] = shard
+                self._shards.move_to_end(tenant)
+                self._evict_over_budget()
+
+        return shard
+
+    def _evict_over_budget(self):
+        # Never evict the most recently used shard, even if it alone exceeds the budget
+        while len(self._shards) > 1 and self.memory_used() > self.memory_budget_bytes:
+            tenant, shard = self._shards.popitem(last=False)
+            logger.info(f"Evicted shard for tenant: {tenant or 'default'} ({shard.size_bytes} bytes)")
+
+    def evict(self, tenant=None):
+        """Drop a tenant's shard from memory."""
+        with self._lock:
+            self._shards.pop(tenant, None)
+
+    def memory_used(self):
+        """Estimated memory held by loaded shards, in bytes."""
+        return sum(shard.size_bytes for shard in self._shards.values())
@@ -4,6 +4,7 @@ Trains a resume-job matching model using the datasets.
 """
 
 import os
+import re
 import sys
 import logging
 import pandas as pd
@@ -18,13 +19,51 @@ logger = logging.getLogger(__name__)
 
 # Add project root to path
 PROJECT_ROOT = os.path.dirname(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+sys.path.append(PROJECT_ROOT)
 
+from src.ml.dedup import DEDUP_THRESHOLD, NUM_PERM, SEED, SHINGLE_SIZE, compute_signatures, find_duplicates
 
-def load_data():
-    """Load resume and job description datasets."""
+# Default TF-IDF settings used for training
+VECTORIZER_PARAMS = {'max_features': 500, 'stop_words': 'english'}
+
+# Tenant names double as directory names
+TENANT_PATTERN = re.compile(r'^[A-Za-z0-9_-]{1,64}$')
+
+
+def validate_tenant(tenant):
+    """Reject tenant names that are not safe to use as directory names."""
+    if tenant is not None and not TENANT_PATTERN.match(tenant):
+        raise ValueError(f"Invalid tenant name: {tenant!r}")
+    return tenant
+
+
+def get_data_dir(tenant=None):
+    """Get the raw data directory for a tenant, or the default dataset."""
+    validate_tenant(tenant)
+    if tenant is None:
+        return os.path.join(PROJECT_ROOT, 'data', 'raw')
+    return os.path.join(PROJECT_ROOT, 'data', 'tenants', tenant)
+
+
+def get_model_path(tenant=None):
+    """Get the model file for a tenant, or the default model."""
+    validate_tenant(tenant)
+    if tenant is None:
+        return os.path.join(PROJECT_ROOT, 'src', 'models', 'resume_matcher.pkl')
+    return os.path.join(PROJECT_ROOT, 'src', 'models', 'tenants', tenant, 'resume_matcher.pkl')
+
+
+def get_uploads_path(tenant=None):
+    """Get the log of resumes accepted through the API for a tenant."""
+    return os.path.join(os.path.dirname(get_model_path(tenant)), 'uploads.jsonl')
+
+
+def load_data(tenant=None):
+    """Load resume and job description datasets for a tenant."""
     try:
-        resume_path = os.path.join(PROJECT_ROOT, 'data', 'raw', 'resume_dataset.csv')
-        job_path = os.path.join(PROJECT_ROOT, 'data', 'raw', 'job_description_dataset.csv')
+        data_dir = get_data_dir(tenant)
+        resume_path = os.path.join(data_dir, 'resume_dataset.csv')
+        job_path = os.path.join(data_dir, 'job_description_dataset.csv')
         
         logger.info(f"Loading resumes from {resume_path}")
         resumes_df = pd.read_csv(resume_path)
@@ -36,6 +75,9 @@ def load_data():
         return resumes_df, jobs_df
     except Exception as e:
         logger.error(f"Error loading data: {e}")
+        # Tenants must provide their own data
+        if tenant is not None:
+            raise
         # Create sample data if files don't exist
         logger.info("Creating sample data...")
         return create_sample_data()
@@ -111,13 +153,8 @@ def preprocess_text(text):
     return str(text).lower()
 
 
-def train_model():
-    """Train the resume-job matching model."""
-    logger.info("Starting model training...")
-    
-    # Load data
-    resumes_df, jobs_df = load_data()
-    
+def build_combined_features(resumes_df, jobs_df):
+    """Add the preprocessed 'combined_features' text column to both datasets."""
     # Combine resume features - use correct column names from the CSV
     resumes_df['combined_features'] = (
         resumes_df['skills'].fillna('') + ' ' +
@@ -134,10 +171,64 @@ def train_model():
         jobs_df['required_skills'].fillna('')
     )
     jobs_df['combined_features'] = jobs_df['combined_features'].apply(preprocess_text)
+    return resumes_df, jobs_df
+
+
+def build_vectorizer(**params):
+    """Create the TF-IDF vectorizer, overriding the default settings with params."""
+    settings = dict(VECTORIZER_PARAMS)
+    settings.update(params)
+    return TfidfVectorizer(**settings)
+
+
+def prepare_corpus(tenant=None, dedup_threshold=DEDUP_THRESHOLD, collapse_duplicates=True):
+    """
+    Load a tenant's data, build features and handle near-duplicate resumes.
+
+    Near-duplicate resumes (estimated Jaccard similarity >= dedup_threshold)
+    are dropped when collapse_duplicates is set, otherwise they are kept and
+    linked to their first occurrence through the 'duplicate_of' column.
+    Returns the resumes, the jobs and the resumes' MinHash signatures.
+    """
+    # Load data
+    resumes_df, jobs_df = load_data(tenant)
+    
+    # Combine resume and job features
+    build_combined_features(resumes_df, jobs_df)
+    
+    # Detect near-duplicate resumes
+    logger.info("Computing MinHash signatures...")
+    signatures = compute_signatures(resumes_df['combined_features'])
+    duplicate_of = find_duplicates(signatures, threshold=dedup_threshold)
+    
+    if collapse_duplicates:
+        keep = duplicate_of < 0
+        duplicate_counts = np.bincount(duplicate_of[~keep], minlength=len(resumes_df))
+        resumes_df['duplicate_count'] = duplicate_counts
+        resumes_df = resumes_df[keep].reset_index(drop=True)
+        signatures = signatures[keep]
+        logger.info(f"Collapsed {int((~keep).sum())} duplicate resumes, {len(resumes_df)} remaining")
+    else:
+        resumes_df['duplicate_of'] = duplicate_of
+    
+    return resumes_df, jobs_df, signatures
+
+
+def train_model(tenant=None, dedup_threshold=DEDUP_THRESHOLD, collapse_duplicates=True):
+    """
+    Train the resume-job matching model for a tenant.
+
+    Each tenant's model is built only from its own data and saved to its own
+    file, so it can be rebuilt without touching other tenants. See
+    prepare_corpus() for how near-duplicate resumes are handled.
+    """
+    logger.info(f"Starting model training for tenant: {tenant or 'default'}")
+    
+    resumes_df, jobs_df, signatures = prepare_corpus(tenant, dedup_threshold, collapse_duplicates)
     
     # Create TF-IDF vectorizer
     logger.info("Creating TF-IDF vectors...")
-    vectorizer = TfidfVectorizer(max_features=500, stop_words='english')
+    vectorizer = build_vectorizer()
     
     # Fit on all text
     all_text = pd.concat([resumes_df['combined_features'], jobs_df['combined_features']])
@@ -156,19 +247,28 @@ def train_model():
         'vectorizer': vectorizer,
         'resumes': resumes_df.to_dict('records'),
         'jobs': jobs_df.to_dict('records'),
-        'similarity_matrix': similarity_matrix
+        'similarity_matrix': similarity_matrix,
+        'minhash_signatures': signatures,
+        'dedup': {
+            'threshold': dedup_threshold,
+            'num_perm': NUM_PERM,
+            'seed': SEED,
+            'shingle_size': SHINGLE_SIZE,
+            'collapsed': collapse_duplicates
+        }
     }
     
-    # Save model
-    model_dir = os.path.join(PROJECT_ROOT, 'src', 'models')
-    os.makedirs(model_dir, exist_ok=True)
-    model_path = os.path.join(model_dir, 'resume_matcher.pkl')
+    # Save model, replacing the old file atomically so it is never read half-written
+    model_path = get_model_path(tenant)
+    os.makedirs(os.path.dirname(model_path), exist_ok=True)
+    tmp_path = model_path + '.tmp'
     
-    joblib.dump(model_data, model_path)
+    joblib.dump(model_data, tmp_path)
+    os.replace(tmp_path, model_path)
     logger.info(f"Model saved to {model_path}")
     
     return model_data
 
 
 if __name__ == "__main__":
-    train_model()
+    train_model(sys.argv[1] if len(sys.argv) > 1 else None)
@@ -0,0 +1,38 @@
+"""
+Helper functions for the Intelligent Resume Screening System.
+"""
+
+import io
+import os
+import logging
+
+logger = logging.getLogger(__name__)
+
+
+def extract_text(filename, contents):
+    """
+    Extract plain text from an uploaded resume.
+
+    Supports PDF, DOCX and plain text files. Returns None when the file type
+    is not supported or no text could be extracted.
+    """
+    extension = os.path.splitext(filename or '')[1].lower()
+    try:
+        if extension == '.pdf':
+            from PyPDF2 import PdfReader
+            reader = PdfReader(io.BytesIO(contents))
+            text = '\n'.join(page.extract_text() or '' for page in reader.pages)
+        elif extension == '.docx':
+            import docx
+            document = docx.Document(io.BytesIO(contents))
+            text = '\n'.join(paragraph.text for paragraph in document.paragraphs)
+        elif extension in ('.txt', ''):
+            text = contents.decode('utf-8')
+        else:
+            logger.warning(f"Unsupported resume format: {filename}")
+            return None
+    except Exception as e:
+        logger.warning(f"Could not extract text from {filename}: {e}")
+        return None
+
+    return text if text.strip() else None